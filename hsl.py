@@ -1,4 +1,5 @@
 import google.transit.gtfs_realtime_pb2 as gtfs
+from google.protobuf.message import DecodeError
 # import multiprocessing
 import concurrent.futures
 import datetime
@@ -9,66 +10,59 @@ import socket
 import configparser
 import logging
 import sys
-import os
 
 api_logger = logging.getLogger(__name__)
 
-# API call
-def fetch_feed(url):
+REQUEST_TIMEOUT = 10  # Seconds before a feed request is given up
+MAX_FEED_WORKERS = 4  # Upper bound of each feed pool
+MAX_DIRECTIONS = 4  # Most directions the timetable can render
+FEED_TICK = 1  # Seconds between checks for due or finished feed fetches
+
+# API call, errors stay with the feed and return an empty feed so other feeds keep running
+def fetch_feed(url, name, timeout=REQUEST_TIMEOUT):
     MAX_RETRIES = 10
     
     for attempt in range(1, MAX_RETRIES + 1):
         try:
             session = requests.Session()
             feed = gtfs.FeedMessage()
-            response = session.get(url)
+            response = session.get(url, timeout=timeout)
             
             if response.status_code == 200:
-                api_logger.info(f"Server status ({response.status_code})")
+                api_logger.info(f"{name} server status ({response.status_code})")
                 feed.ParseFromString(response.content)
                 return feed
             elif 500 <= response.status_code < 600:
-                api_logger.warning(f"Server error ({response.status_code}): Retrying attempt {attempt}...")
+                api_logger.warning(f"{name} server error ({response.status_code}): Retrying attempt {attempt}...")
             else:
-                api_logger.error(f"Client error ({response.status_code}): Cannot fetch feed.")
+                api_logger.error(f"{name} client error ({response.status_code}): Cannot fetch feed.")
                 break  # Break the loop for non-retriable errors
 
+        except DecodeError as e:
+            api_logger.error(f"{name} response is not a GTFS-RT feed: {e}.")
+            break  # Break the loop, the same response would not decode on retry
+
         except requests.exceptions.RequestException as e:
             if isinstance(e, (socket.timeout, requests.exceptions.Timeout)):
-                api_logger.error(f"Timeout error: {e}. Retrying attempt {attempt}...")
+                api_logger.error(f"{name} timeout error: {e}. Retrying attempt {attempt}...")
             elif isinstance(e, requests.exceptions.ConnectionError):
-                api_logger.error(f"Connection error: {e}. Retrying attempt {attempt}...")
+                api_logger.error(f"{name} connection error: {e}. Retrying attempt {attempt}...")
                 time.sleep(5 ** attempt)  # Exponential backoff for connection errors
                 continue  # Move to the next attempt with a new session
             else:
-                api_logger.error(f"Request error: {e}.")
-                sys.exit(1)
-                # break  # Break the loop for other request errors
+                api_logger.error(f"{name} request error: {e}.")
+                break  # Break the loop for other request errors
 
         except Exception as e:
-            api_logger.exception(f"Unexpected error: {e}.")
-            api_logger.warning("Restarting Pi due to critical exception.")
-            # sys.exit(1)
-            os.system("sudo reboot")  # Restart Pi for any exception
-            # break  # Break the loop for unexpected errors
+            api_logger.exception(f"{name} unexpected error: {e}.")
+            break  # Break the loop for unexpected errors
 
         finally:
             session.close()  # Close the session after each attempt
 
-    api_logger.error("Exceeded maximum retries. Returning empty feed.")
+    api_logger.error(f"{name} fetch failed. Returning empty feed.")
     return gtfs.FeedMessage()
 
-# Utilize multicores to process data from API
-def process_feed_multicores(fetch_func):
-    # pool = multiprocessing.Pool(processes=4)
-    # result = pool.apply(fetch_func)
-    # pool.close()
-    # pool.join()
-    # return result
-    with concurrent.futures.ProcessPoolExecutor(max_workers=4) as executor:
-        result = executor.submit(fetch_func)
-        return result.result()
-
 # Write to reponse to file to test
 # def write_to_file(input, file_name):
 #     result_str = str(input)
@@ -77,28 +71,72 @@ def process_feed_multicores(fetch_func):
 
 # Parse data from config.ini file
 class Transit_Config:
-    def __init__(self, trip_update_url, service_alerts_url, stops, language, time_row_num):
+    # Feed sections: the main HSL-CONFIG plus any number of FEED-<name> sections
+    MAIN_SECTION = "HSL-CONFIG"
+    FEED_SECTION_PREFIX = "FEED-"
+
+    def __init__(self, trip_update_url, service_alerts_url, stops, language, time_row_num, name=MAIN_SECTION, poll_interval=15, alert_interval=300):
         self.trip_update_url = trip_update_url
         self.service_alerts_url = service_alerts_url
         self.stops = stops
         self.language = language
         self.time_row_num = time_row_num
+        self.name = name
+        self.poll_interval = int(poll_interval)
+        self.alert_interval = int(alert_interval)
     
     @staticmethod
-    def get_config():
+    def get_configs():
         config = configparser.ConfigParser()
         config.read("config.ini")
-        if "HSL-CONFIG" not in config:
-            api_logger.error("No or badly formatted 'HSL-CONFIG' section found in config file.")
+        if Transit_Config.MAIN_SECTION not in config:
+            api_logger.error(f"No or badly formatted '{Transit_Config.MAIN_SECTION}' section found in config file.")
             sys.exit(1)  # Exit with an error code indicating failure
 
-        config_options = ["trip_update_url", "service_alerts_url", "stops", "language", "time_row_num"]
-        configured_values = {}
-        for option in config_options:
-            configured_value = config['HSL-CONFIG'].get(option)
-            if not configured_value:
-                api_logger.error(f"Missing {option} from config file, but it is required.")
+        sections = [Transit_Config.MAIN_SECTION] + [
+            section for section in config.sections() if section.startswith(Transit_Config.FEED_SECTION_PREFIX)
+        ]
+        configs = [Transit_Config._from_section(config[section], section) for section in sections]
+        Transit_Config._check_directions(configs)
+        return configs
+
+    @staticmethod
+    def _check_directions(configs):
+        # Feeds are merged into one timetable keyed by direction name.
+        # Stops within one feed may share a direction name to merge their departures.
+        direction_names = []
+        for config in configs:
+            try:
+                stops = json.loads(config.stops)
+            except ValueError as e:
+                api_logger.error(f"Badly formatted stops in {config.name} in config file: {e}")
                 sys.exit(1)  # Exit with an error code indicating failure
+            feed_direction_names = {stop['direction_name'] for stop in stops}
+            for direction_name in feed_direction_names:
+                if direction_name in direction_names:
+                    api_logger.error(f"Direction name {direction_name} in {config.name} is already used by another feed, direction names must be unique across feeds.")
+                    sys.exit(1)  # Exit with an error code indicating failure
+            direction_names.extend(feed_direction_names)
+
+        if len(direction_names) > MAX_DIRECTIONS:
+            api_logger.error(f"{len(direction_names)} directions configured, but up to {MAX_DIRECTIONS} are supported.")
+            sys.exit(1)  # Exit with an error code indicating failure
+
+    @staticmethod
+    def _from_section(section, name):
+        # Alerts URL is only required for HSL, other agencies may not publish alerts
+        required_options = ["trip_update_url", "stops", "language", "time_row_num"]
+        if name == Transit_Config.MAIN_SECTION:
+            required_options.append("service_alerts_url")
+        optional_options = ["service_alerts_url", "poll_interval", "alert_interval"]
+
+        configured_values = {"name": name, "service_alerts_url": None}
+        for option in required_options + optional_options:
+            configured_value = section.get(option)
+            if not configured_value:
+                if option in required_options:
+                    api_logger.error(f"Missing {option} from {name} in config file, but it is required.")
+                    sys.exit(1)  # Exit with an error code indicating failure
             else:
                 configured_values[option] = configured_value.strip()
 
@@ -109,32 +147,130 @@ class HSL_Trip_Update:
         self.transit_config = transit_config        
         self.stops = json.loads(self.transit_config.stops)
         self.stop_status = {stop['direction_name']: [] for stop in self.stops}
+        self.poll_interval = self.transit_config.poll_interval
+        # Stops without route_id accept any route, so the route pre-filter is off for them
+        self._route_ids = None if any(not stop.get('route_id') for stop in self.stops) else {
+            route_id for stop in self.stops for route_id in stop['route_id']
+        }
 
-    def process_feed(self):
-        feed = fetch_feed(self.transit_config.trip_update_url)
+        # Per-trip state kept between fetches so each new feed is applied as a delta
+        self._trips = {}  # entity id -> {'trip_id': '1234', 'arrivals': {'Kivenlahti': [timestamp, ...]}}
+        self._trip_entities = {}  # trip id -> entity id
+        self._last_feed_timestamp = None
+        # Departures last pushed to the renderer, so only changed stops are sent again
+        self._pushed_status = {}
+
+    def fetch(self):
+        return fetch_feed(self.transit_config.trip_update_url, self.transit_config.name)
+
+    def apply_feed(self, feed):
         current_time = datetime.datetime.now()
-        stop_times = self._extract_stop_times(feed, current_time)
+        self._apply_delta(feed, current_time)
+        return self.refresh(current_time)
+
+    def refresh(self, current_time):
+        # Recompute departures from the cached trips, also used while a fetch is late
+        self._prune_trips(current_time)
+        stop_times = self._extract_stop_times(current_time)
         result = self._process_stop_times(stop_times, current_time)
-        return result
+        return self._changed_stops(result)
 
-    def _extract_stop_times(self, feed, current_time):
-        if not feed:
-            api_logger.warning("Trip status fetch did not return any data.")
-            return {}
+    def _apply_delta(self, feed, current_time):
+        if not feed.HasField('header'):
+            api_logger.warning(f"{self.transit_config.name} trip status fetch did not return any data.")
+            return
+
+        # Same snapshot as last time, nothing to apply
+        if feed.header.timestamp and feed.header.timestamp == self._last_feed_timestamp:
+            api_logger.info(f"{self.transit_config.name} trip status feed unchanged since last fetch.")
+            return
+        self._last_feed_timestamp = feed.header.timestamp
 
-        trips = self.stop_status
+        # A differential feed only carries changed trips, a full dataset carries all of them
+        differential = feed.header.incrementality == gtfs.FeedHeader.DIFFERENTIAL
+        seen_entities = set()
+        added, updated, removed = 0, 0, 0
+        now = current_time.timestamp()
 
         for entity in feed.entity:
-            if entity.HasField('trip_update'):
-                route_id = entity.trip_update.trip.route_id
-                for stop_time_update in entity.trip_update.stop_time_update:
-                    stop_id = stop_time_update.stop_id
-                    arrival_time = stop_time_update.arrival.time
-                    arrival_time_dt = datetime.datetime.fromtimestamp(arrival_time)
-                    for stop in self.stops:
-                        if stop_id == stop['stop_id'] and route_id in stop['route_id']:
-                            if arrival_time_dt > current_time:
-                                trips[stop['direction_name']].append(arrival_time)
+            if entity.is_deleted:
+                removed += self._remove_trip(entity.id)
+                continue
+            if not entity.HasField('trip_update'):
+                continue
+
+            seen_entities.add(entity.id)
+            trip_id = entity.trip_update.trip.trip_id
+            # Same trip may come back under another entity id
+            previous_entity = self._trip_entities.get(trip_id)
+            if trip_id and previous_entity is not None and previous_entity != entity.id:
+                removed += self._remove_trip(previous_entity)
+
+            arrivals = self._extract_arrivals(entity.trip_update, now)
+            if not arrivals:
+                # Trip no longer serves any of our stops
+                removed += self._remove_trip(entity.id)
+                continue
+
+            trip = self._trips.get(entity.id)
+            if trip is None:
+                added += 1
+            elif trip['arrivals'] != arrivals:
+                updated += 1
+            else:
+                continue
+
+            self._trips[entity.id] = {'trip_id': trip_id, 'arrivals': arrivals}
+            if trip_id:
+                self._trip_entities[trip_id] = entity.id
+
+        if not differential:
+            for entity_id in [entity_id for entity_id in self._trips if entity_id not in seen_entities]:
+                removed += self._remove_trip(entity_id)
+
+        api_logger.info(f"{self.transit_config.name} trip delta: {added} added, {updated} updated, {removed} removed")
+
+    def _extract_arrivals(self, trip_update, now):
+        arrivals = {}
+        route_id = trip_update.trip.route_id
+        if self._route_ids is not None and route_id not in self._route_ids:
+            return arrivals
+
+        for stop_time_update in trip_update.stop_time_update:
+            stop_id = stop_time_update.stop_id
+            # Not every agency publishes arrival times, fall back to the departure
+            arrival_time = stop_time_update.arrival.time or stop_time_update.departure.time
+            # Passed stops are dropped, so a trip past all our stops is not stored at all
+            if arrival_time <= now:
+                continue
+            for stop in self.stops:
+                if stop_id == stop['stop_id'] and (not stop.get('route_id') or route_id in stop['route_id']):
+                    arrivals.setdefault(stop['direction_name'], []).append(arrival_time)
+
+        return arrivals
+
+    def _remove_trip(self, entity_id):
+        trip = self._trips.pop(entity_id, None)
+        if trip is None:
+            return 0
+        if self._trip_entities.get(trip['trip_id']) == entity_id:
+            del self._trip_entities[trip['trip_id']]
+        return 1
+
+    def _prune_trips(self, current_time):
+        # Drop trips whose stored arrivals have since passed, differential feeds may never delete them
+        now = current_time.timestamp()
+        for entity_id, trip in list(self._trips.items()):
+            if all(arrival_time <= now for times in trip['arrivals'].values() for arrival_time in times):
+                self._remove_trip(entity_id)
+
+    def _extract_stop_times(self, current_time):
+        trips = {direction_name: [] for direction_name in self.stop_status}
+        now = current_time.timestamp()
+
+        for trip in self._trips.values():
+            for direction_name, times in trip['arrivals'].items():
+                trips[direction_name].extend(arrival_time for arrival_time in times if arrival_time > now)
         
         api_logger.debug(trips)
         return trips
@@ -154,13 +290,25 @@ class HSL_Trip_Update:
         api_logger.info(stop_times)
         return stop_times
 
-    def transport_status(self):
-        return process_feed_multicores(self.process_feed)
+    def _changed_stops(self, stop_times):
+        # Only stops whose departures differ from what the renderer already has
+        changed = {
+            direction_name: times
+            for direction_name, times in stop_times.items()
+            if self._pushed_status.get(direction_name) != times
+        }
+        self._pushed_status.update(changed)
+
+        api_logger.debug(f"Changed stops: {list(changed)}")
+        return changed
 
 class HSL_Service_Alert:
     def __init__(self, transit_config):
         self.transit_config = transit_config
         self._informed_ids = self._get_route_ids()
+        self.poll_interval = self.transit_config.alert_interval
+        # Last known message, kept when a fetch fails
+        self.alert_message = None
     
     def _get_route_ids(self):
         stops = json.loads(self.transit_config.stops)
@@ -169,19 +317,20 @@ class HSL_Service_Alert:
 
         for stop in stops:
             stop_ids.add(stop["stop_id"])
-            route_ids.update(stop["route_id"])
+            route_ids.update(stop.get("route_id", []))
 
         return list(stop_ids | route_ids)
 
-    def process_alert(self):
-        feed = fetch_feed(self.transit_config.service_alerts_url)
+    def fetch(self):
+        return fetch_feed(self.transit_config.service_alerts_url, self.transit_config.name)
 
-        if feed:
-            alert_message = self._extract_service_alert(feed)
+    def apply_alert(self, feed):
+        if feed.HasField('header'):
+            self.alert_message = self._extract_service_alert(feed)
         else:
-            api_logger.warning("Service alert fetch did not return any data.")
+            api_logger.warning(f"{self.transit_config.name} service alert fetch did not return any data.")
 
-        return alert_message
+        return self.alert_message
 
     def _extract_service_alert(self, feed):
         messages = set()
@@ -220,5 +369,82 @@ class HSL_Service_Alert:
         
         return ""
 
+# Poll several feed sources on one bounded thread pool, each update process owns one
+class Transit_Feeds:
+    def __init__(self, sources, max_workers=MAX_FEED_WORKERS):
+        self.sources = sources
+        self.max_workers = min(max_workers, len(sources))
+        self._executor = None
+        self._pending = {}  # source -> running fetch
+        self._next_poll = {}  # source -> monotonic time of the next fetch
+
+    def _poll(self):
+        if not self.sources:
+            return {}
+        # Created lazily so the pool lives in the update process that uses it
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+
+        now = time.monotonic()
+        for source in self.sources:
+            # At most one fetch per source in flight, so a slow feed only holds its own worker
+            if source not in self._pending and now >= self._next_poll.get(source, 0):
+                self._pending[source] = self._executor.submit(source.fetch)
+                self._next_poll[source] = now + source.poll_interval
+
+        feeds = {}
+        for source in self.sources:
+            future = self._pending.get(source)
+            if future is None or not future.done():
+                continue
+            del self._pending[source]
+            try:
+                feeds[source] = future.result()
+            except (Exception, SystemExit) as e:
+                # A failing feed keeps its cached data and does not affect the others
+                api_logger.error(f"{source.transit_config.name} feed fetch failed: {e}")
+
+        return feeds
+
+    def _overdue(self):
+        # Sources due for their next poll while the previous fetch is still running
+        now = time.monotonic()
+        return [source for source in self._pending if now >= self._next_poll[source]]
+
+class Transit_Trip_Feeds(Transit_Feeds):
+    def __init__(self, transit_configs, max_workers=MAX_FEED_WORKERS):
+        super().__init__([HSL_Trip_Update(config) for config in transit_configs], max_workers)
+        # Merged departure view in config order
+        self.stop_status = {}
+        for trip_update in self.sources:
+            self.stop_status.update(trip_update.stop_status)
+
+    def transport_status(self):
+        changed = {}
+        for trip_update, feed in self._poll().items():
+            try:
+                changed.update(trip_update.apply_feed(feed))
+            except Exception as e:
+                # A feed that fails to apply does not drop the changes of the others
+                api_logger.exception(f"{trip_update.transit_config.name} feed could not be applied: {e}")
+
+        # Keep the cached departures of late feeds counting down
+        current_time = datetime.datetime.now()
+        for trip_update in self._overdue():
+            try:
+                changed.update(trip_update.refresh(current_time))
+            except Exception as e:
+                api_logger.exception(f"{trip_update.transit_config.name} cached departures could not be refreshed: {e}")
+
+        return changed
+
+class Transit_Alert_Feeds(Transit_Feeds):
+    def __init__(self, transit_configs, max_workers=MAX_FEED_WORKERS):
+        super().__init__([HSL_Service_Alert(config) for config in transit_configs if config.service_alerts_url], max_workers)
+
     def service_alert(self):
-        return process_feed_multicores(self.process_alert)
\ No newline at end of file
+        for service_alert, feed in self._poll().items():
+            service_alert.apply_alert(feed)
+
+        messages = [service_alert.alert_message for service_alert in self.sources if service_alert.alert_message]
+        return ' '.join(messages) if messages else None
@@ -64,10 +64,10 @@ class Transport:
         # Update trip data
         if not data_queue.empty():
             updated_data = data_queue.get()
-            # Only update if there is new data
-            if self.trip_status != updated_data:
-                logger.info("Update trip data")
-                self.trip_status = updated_data
+            # Queue only carries stops whose departures changed, merge them in
+            if updated_data:
+                logger.info(f"Update trip data: {list(updated_data)}")
+                self.trip_status = {**(self.trip_status or {}), **updated_data}
         
         if self.trip_status is not None:
             # Clear screen before rendering new data
@@ -119,7 +119,9 @@ class Transport:
                             y = RIGHT_COL_Y
                     # Render setting for 3 and 4 platforms
                     elif platform_count in (3, 4):
-                        text_render(self.screen, render_font(game_font, times[0], font_color), COL_WIDTH, self.table_x, x, y)
+                        # A direction can have no departures yet, keep its row empty
+                        if times:
+                            text_render(self.screen, render_font(game_font, times[0], font_color), COL_WIDTH, self.table_x, x, y)
                         y += ROW_SPACER
                         row += 1
                         
@@ -188,9 +190,11 @@ class Transport:
             self.screen.blit(self._img_double, (self.bottom_band_x, self.bottom_band_y))
 
     def run(self):
-        config = Transit_Config.get_config()
-        trip_update = HSL_Trip_Update(config)
-        service_message = HSL_Service_Alert(config)
+        configs = Transit_Config.get_configs()
+        trip_feeds = Transit_Trip_Feeds(configs)
+        alert_feeds = Transit_Alert_Feeds(configs)
+        # Seed the directions in config order, updates only carry changed ones
+        self.trip_status = dict(trip_feeds.stop_status)
 
         game_font, font_color = setup_fonts()
 
@@ -199,8 +203,9 @@ class Transport:
         alert_queue = multiprocessing.Queue()
         stop_flag = self.stop_flag # Stop process flag
 
-        trip_update_process = multiprocessing.Process(target=update_process, args=("Transport status update", stop_flag, fetch_data, (trip_update, 'transport_status'), 15, trip_queue))
-        alert_update_process = multiprocessing.Process(target=update_process, args=("Service alert update", stop_flag, fetch_data, (service_message, 'service_alert'), 300, alert_queue))
+        # Each process fetches its feeds on its own pool and poll intervals, the processes only tick
+        trip_update_process = multiprocessing.Process(target=update_process, args=("Transport status update", stop_flag, fetch_data, (trip_feeds, 'transport_status'), FEED_TICK, trip_queue), kwargs={'skip_empty': True})
+        alert_update_process = multiprocessing.Process(target=update_process, args=("Service alert update", stop_flag, fetch_data, (alert_feeds, 'service_alert'), FEED_TICK, alert_queue), kwargs={'skip_unchanged': True})
 
         trip_update_process.start()
         alert_update_process.start()
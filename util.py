@@ -34,12 +34,16 @@ def fetch_data(instance, method_name):
     return False
 
 # Process API calls and push result onto queue
-def update_process(process_identifier, stop_flag, updater_func, updater_args, interval, queue):
+def update_process(process_identifier, stop_flag, updater_func, updater_args, interval, queue, skip_empty=False, skip_unchanged=False):
+    last_result = None
     try:
         while not stop_flag.is_set():
             try:
                 result = updater_func(*updater_args)
-                queue.put(result)
+                # Skip empty change sets and results already pushed, if the updater asks for it
+                if (result or not skip_empty) and (result != last_result or not skip_unchanged):
+                    queue.put(result)
+                    last_result = result
                 # Synchronize sleep with stop_flag.wait() for a specific interval
                 stop_flag.wait(interval)
             except KeyboardInterrupt: